@@ -16,3 +16,6 @@ RUN_FLAG = 'delete-me-to-stop-logger'
 MSG_BATTERY = ["adb", "shell", "dumpsys", "battery"]
 MSG_TELEPHONY = ["adb", "shell", "dumpsys", "telephony.registry"]
 LOG_PATH = '/tmp/neo_log.log'
+# Gaps between samples longer than this (seconds) are treated as the logger
+# being stopped and are not counted as radio dwell time
+MAX_SAMPLE_GAP = 60 * 60
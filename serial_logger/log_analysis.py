@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+""" Offline analysis of the cmd_response_logger log files
+
+Battery and telephony records are loaded into NumPy arrays so that summaries
+over weeks of data are computed with vectorised operations. The parsed
+arrays for each log file are cached in a '<log>.npz' sidecar, keyed by the
+size and mtime of the log, so that later runs only parse lines appended
+since the previous run.
+
+"""
+import os
+import glob
+import logging
+import zipfile
+from collections import namedtuple
+
+import numpy as np
+
+import serial_logger.config as cfg
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".npz"
+CACHE_VERSION = 1
+
+# Number of bytes at the start of a log used to spot that the file has been
+# replaced (e.g. by log rotation) rather than appended to.
+HEAD_BYTES = 64
+
+BATTERY_FIELDS = ["time", "level", "scale", "voltage", "temperature", "powered"]
+BatteryLog = namedtuple("BatteryLog", BATTERY_FIELDS)
+
+RADIO_FIELDS = ["time", "radio"]
+RadioLog = namedtuple("RadioLog", RADIO_FIELDS)
+
+POWER_SOURCES = ["AC powered", "USB powered", "Wireless powered"]
+RADIO_PREFIX = "Data_Radio="
+
+
+def _empty_battery():
+    """Return a BatteryLog with no samples"""
+    return BatteryLog(
+        time=np.array([], dtype="datetime64[s]"),
+        level=np.array([], dtype=np.int32),
+        scale=np.array([], dtype=np.int32),
+        voltage=np.array([], dtype=np.int32),
+        temperature=np.array([], dtype=np.int32),
+        powered=np.array([], dtype=bool),
+    )
+
+
+def _empty_radio():
+    """Return a RadioLog with no samples"""
+    return RadioLog(
+        time=np.array([], dtype="datetime64[s]"),
+        radio=np.array([], dtype=str),
+    )
+
+
+def parse_log_text(text):
+    """Parse log text written by cmd_response_logger.main()
+
+    Each line has the form '<date> <time>,<level>,<logger>,<message>'. Battery
+    messages come from parse_adb_battery() and telephony messages from
+    parse_adb_telephony(). Any other lines are ignored.
+
+    Returns a (BatteryLog, RadioLog) tuple of arrays.
+    """
+    bat_rows = []
+    bat_times = []
+    radio_rows = []
+    radio_times = []
+
+    for line in text.splitlines():
+        fields = line.split(",", 3)
+        if len(fields) != 4:
+            continue
+        message = fields[3]
+        try:
+            timestamp = np.datetime64(fields[0], "s")
+        except ValueError:
+            continue
+
+        if message.startswith(RADIO_PREFIX):
+            radio_times.append(timestamp)
+            radio_rows.append(message[len(RADIO_PREFIX):])
+            continue
+
+        params = dict(
+            item.split(":", 1) for item in message.split(",") if ":" in item
+        )
+        try:
+            row = (
+                int(params["level"]),
+                int(params["scale"]),
+                int(params["voltage"]),
+                int(params["temperature"]),
+                any(params.get(src) == "true" for src in POWER_SOURCES),
+            )
+        except (KeyError, ValueError):
+            continue
+        bat_times.append(timestamp)
+        bat_rows.append(row)
+
+    battery = _empty_battery()
+    if bat_rows:
+        level, scale, voltage, temperature, powered = zip(*bat_rows)
+        battery = BatteryLog(
+            time=np.array(bat_times, dtype="datetime64[s]"),
+            level=np.array(level, dtype=np.int32),
+            scale=np.array(scale, dtype=np.int32),
+            voltage=np.array(voltage, dtype=np.int32),
+            temperature=np.array(temperature, dtype=np.int32),
+            powered=np.array(powered, dtype=bool),
+        )
+
+    radio = _empty_radio()
+    if radio_rows:
+        radio = RadioLog(
+            time=np.array(radio_times, dtype="datetime64[s]"),
+            radio=np.array(radio_rows, dtype=str),
+        )
+
+    return battery, radio
+
+
+def _concat(first, second):
+    """Concatenate two BatteryLog or RadioLog tuples field by field"""
+    return type(first)(
+        *(np.concatenate([a, b]) for a, b in zip(first, second))
+    )
+
+
+def _cache_path(log_path):
+    """Return the path of the sidecar cache file for a log"""
+    return f"{log_path}{CACHE_SUFFIX}"
+
+
+def _read_cache(log_path):
+    """Return the cached arrays and metadata for a log, or None"""
+    try:
+        with np.load(_cache_path(log_path), allow_pickle=False) as npz:
+            if int(npz["version"]) != CACHE_VERSION:
+                return None
+            return {key: npz[key] for key in npz.files}
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile) as err:
+        LOGGER.debug("Ignoring cache for %s. err=%s", log_path, err)
+        return None
+
+
+def _from_cache(cache):
+    """Build (BatteryLog, RadioLog) tuples from cached arrays"""
+    battery = BatteryLog(*(cache[f"battery_{k}"] for k in BATTERY_FIELDS))
+    radio = RadioLog(*(cache[f"radio_{k}"] for k in RADIO_FIELDS))
+    return battery, radio
+
+
+def _write_cache(log_path, battery, radio, stat, offset, head):
+    """Save the parsed arrays for a log to its sidecar cache file"""
+    path = _cache_path(log_path)
+    tmp_path = f"{path}.tmp"
+    arrays = {f"battery_{k}": v for k, v in battery._asdict().items()}
+    arrays.update({f"radio_{k}": v for k, v in radio._asdict().items()})
+    try:
+        with open(tmp_path, "wb") as file:
+            np.savez(
+                file,
+                version=CACHE_VERSION,
+                size=stat.st_size,
+                mtime=stat.st_mtime_ns,
+                offset=offset,
+                head=np.frombuffer(head, dtype=np.uint8),
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+    except OSError as err:
+        LOGGER.warning("Unable to write cache for %s. err=%s", log_path, err)
+
+
+def load_log(log_path, use_cache=True):
+    """Load a single log file into (BatteryLog, RadioLog) arrays
+
+    If a cache exists with a matching size and mtime it is returned without
+    reading the log. If the log has grown since the cache was written then
+    only the new lines are parsed and the cache is updated. A partial last
+    line is left for the next run.
+    """
+    stat = os.stat(log_path)
+    cache = _read_cache(log_path) if use_cache else None
+
+    if (
+        cache is not None
+        and int(cache["size"]) == stat.st_size
+        and int(cache["mtime"]) == stat.st_mtime_ns
+    ):
+        return _from_cache(cache)
+
+    with open(log_path, "rb") as file:
+        head = file.read(HEAD_BYTES)
+        offset = 0
+        battery, radio = _empty_battery(), _empty_radio()
+
+        if (
+            cache is not None
+            and cache["head"].tobytes() == head[: len(cache["head"])]
+            and int(cache["offset"]) <= stat.st_size
+        ):
+            offset = int(cache["offset"])
+            battery, radio = _from_cache(cache)
+
+        file.seek(offset)
+        data = file.read(stat.st_size - offset)
+
+    end = data.rfind(b"\n") + 1
+    if end:
+        new_battery, new_radio = parse_log_text(
+            data[:end].decode("utf-8", errors="replace")
+        )
+        battery = _concat(battery, new_battery)
+        radio = _concat(radio, new_radio)
+
+    if use_cache:
+        _write_cache(log_path, battery, radio, stat, offset + end, head)
+
+    return battery, radio
+
+
+def load_logs(log_paths, use_cache=True):
+    """Load several log files (e.g. a log and its rotated backups)
+
+    The samples are merged and sorted by time.
+    """
+    battery, radio = _empty_battery(), _empty_radio()
+    for log_path in log_paths:
+        new_battery, new_radio = load_log(log_path, use_cache=use_cache)
+        battery = _concat(battery, new_battery)
+        radio = _concat(radio, new_radio)
+
+    order = np.argsort(battery.time, kind="stable")
+    battery = BatteryLog(*(field[order] for field in battery))
+    order = np.argsort(radio.time, kind="stable")
+    radio = RadioLog(*(field[order] for field in radio))
+    return battery, radio
+
+
+def battery_percent(battery):
+    """Return the battery level as a percentage of full scale"""
+    return 100.0 * battery.level / np.where(battery.scale > 0, battery.scale, 100)
+
+
+def drain_rate(battery, max_gap=None):
+    """Return the mean discharge rate in percent per hour
+
+    Only intervals where the device was unpowered at both ends are used.
+    Gaps longer than 'max_gap' seconds (e.g. while the logger was stopped)
+    are ignored. Returns NaN if there are no such intervals.
+    """
+    hours = np.diff(battery.time).astype(np.float64) / 3600
+    change = np.diff(battery_percent(battery))
+    mask = ~battery.powered[:-1] & ~battery.powered[1:] & (hours > 0)
+    if max_gap is not None:
+        mask &= hours * 3600 <= max_gap
+    total_hours = hours[mask].sum()
+    if total_hours == 0:
+        return float("nan")
+    return float(-change[mask].sum() / total_hours)
+
+
+def charge_cycles(battery):
+    """Return the number of equivalent full charge cycles
+
+    This is the sum of all increases in battery percentage divided by 100,
+    so two charges from 50% to 100% count as one cycle.
+    """
+    change = np.diff(battery_percent(battery))
+    return float(np.clip(change, 0, None).sum() / 100)
+
+
+def resample(times, values, interval):
+    """Resample a series onto a regular time grid
+
+    'interval' is a numpy.timedelta64 (e.g. np.timedelta64(1, 'h')). Values
+    falling in each interval are averaged; empty intervals are NaN.
+
+    Returns a (bin_times, means) tuple.
+    """
+    if len(times) == 0:
+        return np.array([], dtype=times.dtype), np.array([], dtype=np.float64)
+
+    start = times.min()
+    bins = ((times - start) // interval).astype(np.int64)
+    count = np.bincount(bins)
+    total = np.bincount(bins, weights=values.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(count > 0, total / count, np.nan)
+    bin_times = start + np.arange(len(count)) * interval
+    return bin_times, means
+
+
+def radio_dwell(radio, max_gap=None):
+    """Return a dict of seconds spent on each data radio technology
+
+    The time between consecutive samples is credited to the technology of
+    the earlier sample. Gaps longer than 'max_gap' seconds (e.g. while the
+    logger was stopped) are ignored.
+    """
+    if len(radio.time) < 2:
+        return {}
+
+    durations = np.diff(radio.time).astype(np.float64)
+    if max_gap is not None:
+        durations[durations > max_gap] = 0
+
+    names, index = np.unique(radio.radio[:-1], return_inverse=True)
+    seconds = np.bincount(index, weights=durations, minlength=len(names))
+    return dict(zip(names.tolist(), seconds.tolist()))
+
+
+def main(log_paths):
+    """Print summaries for the given log files"""
+    if not log_paths:
+        LOGGER.error("No log files found. path=%s", cfg.LOG_PATH)
+        return
+
+    battery, radio = load_logs(log_paths)
+    LOGGER.info(
+        "Battery samples=%s, Radio samples=%s", len(battery.time), len(radio.time)
+    )
+    LOGGER.info(
+        "Drain rate (%%/hour)=%.2f", drain_rate(battery, max_gap=cfg.MAX_SAMPLE_GAP)
+    )
+    LOGGER.info("Charge cycles=%.2f", charge_cycles(battery))
+    for name, seconds in radio_dwell(radio, max_gap=cfg.MAX_SAMPLE_GAP).items():
+        LOGGER.info("Data_Radio=%s, hours=%.2f", name, seconds / 3600)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Include the rotated backups written by the RotatingFileHandler
+    main(glob.glob(cfg.LOG_PATH) + glob.glob(f"{cfg.LOG_PATH}.[0-9]"))
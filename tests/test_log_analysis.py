@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests for log_analysis.py
+"""
+import os
+import logging
+
+import numpy as np
+import pytest
+
+from serial_logger import log_analysis as la
+
+
+def battery_line(timestamp, level, usb="false"):
+    """Return a log line as written by cmd_response_logger for a battery response"""
+    return (
+        f"{timestamp},INFO,__main__,AC powered:false,USB powered:{usb},"
+        "Wireless powered:false,Max charging current:0,Max charging voltage:0,"
+        f"Charge counter:470066,status:2,health:2,present:true,level:{level},"
+        "scale:100,voltage:4110,temperature:360,technology:Li-ion\n"
+    )
+
+
+def radio_line(timestamp, radio):
+    """Return a log line as written by cmd_response_logger for a telephony response"""
+    return f"{timestamp},INFO,__main__,Data_Radio={radio}\n"
+
+
+LOG_TEXT = (
+    radio_line("2022-01-06 09:00:00", "14(LTE)")
+    + battery_line("2022-01-06 09:00:00", 80)
+    + "2022-01-06 09:30:00,ERROR,__main__,adb command failed.\n"
+    + "garbage,x,y,Data_Radio=LTE\n"
+    + radio_line("2022-01-06 10:00:00", "3(UMTS)")
+    + battery_line("2022-01-06 10:00:00", 70)
+    + radio_line("2022-01-06 10:30:00", "14(LTE)")
+    + battery_line("2022-01-06 11:00:00", 60)
+    + battery_line("2022-01-06 12:00:00", 90, usb="true")
+    + battery_line("2022-01-06 13:00:00", 100, usb="true")
+)
+
+
+def test_parse_log_text():
+    """Check battery and radio records are extracted and other lines ignored"""
+    battery, radio = la.parse_log_text(LOG_TEXT)
+    assert battery.level.tolist() == [80, 70, 60, 90, 100]
+    assert battery.powered.tolist() == [False, False, False, True, True]
+    assert battery.time[0] == np.datetime64("2022-01-06T09:00:00")
+    assert radio.radio.tolist() == ["14(LTE)", "3(UMTS)", "14(LTE)"]
+
+
+def test_drain_rate_and_charge_cycles():
+    """Check the drain rate ignores powered intervals"""
+    battery, _ = la.parse_log_text(LOG_TEXT)
+    assert la.drain_rate(battery) == pytest.approx(10.0)
+    assert la.charge_cycles(battery) == pytest.approx(0.4)
+
+
+def test_drain_rate_max_gap():
+    """Check a gap where the device was charged while the logger was stopped"""
+    battery, _ = la.parse_log_text(
+        battery_line("2022-01-06 20:00:00", 50)
+        + battery_line("2022-01-06 21:00:00", 40)
+        + battery_line("2022-01-06 22:00:00", 30)
+        + battery_line("2022-01-07 08:00:00", 100)
+        + battery_line("2022-01-07 09:00:00", 90)
+    )
+    assert la.drain_rate(battery) < 0
+    assert la.drain_rate(battery, max_gap=3600) == pytest.approx(10.0)
+
+
+def test_radio_dwell():
+    """Check time is credited to the earlier sample's radio technology"""
+    _, radio = la.parse_log_text(LOG_TEXT)
+    assert la.radio_dwell(radio) == {"14(LTE)": 3600.0, "3(UMTS)": 1800.0}
+    assert la.radio_dwell(radio, max_gap=1800) == {"14(LTE)": 0.0, "3(UMTS)": 1800.0}
+
+
+def test_resample():
+    """Check values are averaged into regular bins with NaN for empty bins"""
+    times = np.array(
+        ["2022-01-06T09:00", "2022-01-06T09:20", "2022-01-06T11:10"],
+        dtype="datetime64[s]",
+    )
+    bin_times, means = la.resample(
+        times, np.array([10, 20, 30]), np.timedelta64(1, "h")
+    )
+    assert bin_times.tolist() == np.array(
+        ["2022-01-06T09:00", "2022-01-06T10:00", "2022-01-06T11:00"],
+        dtype="datetime64[s]",
+    ).tolist()
+    np.testing.assert_array_equal(means, [15.0, np.nan, 30.0])
+
+
+def test_cache_incremental(tmp_path, monkeypatch):
+    """Check the sidecar cache is used and only appended lines are parsed"""
+    log_path = tmp_path / "neo_log.log"
+    log_path.write_text(LOG_TEXT + battery_line("2022-01-06 14:00:00", 95)[:20])
+
+    battery, _ = la.load_log(str(log_path))
+    assert len(battery.time) == 5
+    assert os.path.exists(f"{log_path}.npz")
+
+    parsed = []
+    parse_log_text = la.parse_log_text
+    monkeypatch.setattr(
+        la, "parse_log_text", lambda text: parsed.append(text) or parse_log_text(text)
+    )
+
+    # Unchanged log is served from the cache without parsing
+    battery, _ = la.load_log(str(log_path))
+    assert len(battery.time) == 5
+    assert not parsed
+
+    # Completing the partial line only parses the new data
+    with open(log_path, "a", encoding="utf-8") as file:
+        file.write(battery_line("2022-01-06 14:00:00", 95)[20:])
+    battery, _ = la.load_log(str(log_path))
+    assert battery.level.tolist() == [80, 70, 60, 90, 100, 95]
+    assert len(parsed) == 1 and parsed[0].count("\n") == 1
+
+    # A replaced (rotated) log is parsed from the start
+    log_path.write_text(radio_line("2022-01-07 09:00:00", "16(GSM)") + LOG_TEXT)
+    battery, radio = la.load_log(str(log_path))
+    assert len(battery.time) == 5
+    assert radio.radio[0] == "16(GSM)"
+
+
+@pytest.mark.parametrize("sidecar", [b"", b"PK\x03\x04 not really a zip file"])
+def test_damaged_cache(tmp_path, sidecar):
+    """Check a damaged sidecar is ignored and the log is parsed again"""
+    log_path = tmp_path / "neo_log.log"
+    log_path.write_text(LOG_TEXT)
+    (tmp_path / "neo_log.log.npz").write_bytes(sidecar)
+
+    battery, radio = la.load_log(str(log_path))
+    assert battery.level.tolist() == [80, 70, 60, 90, 100]
+    assert len(radio.time) == 3
+
+
+def test_main_ignores_gaps(tmp_path, caplog):
+    """Check the CLI report leaves out gaps longer than MAX_SAMPLE_GAP"""
+    log_path = tmp_path / "neo_log.log"
+    log_path.write_text(
+        radio_line("2022-01-06 20:00:00", "14(LTE)")
+        + battery_line("2022-01-06 20:00:00", 50)
+        + radio_line("2022-01-06 20:30:00", "3(UMTS)")
+        + battery_line("2022-01-06 21:00:00", 40)
+        + radio_line("2022-01-07 08:00:00", "14(LTE)")
+        + battery_line("2022-01-07 08:00:00", 100)
+        + radio_line("2022-01-07 08:30:00", "14(LTE)")
+        + battery_line("2022-01-07 09:00:00", 90)
+    )
+    caplog.set_level(logging.INFO, logger=la.__name__)
+    la.main([str(log_path)])
+    assert "Drain rate (%/hour)=10.00" in caplog.messages
+    assert "Data_Radio=14(LTE), hours=1.00" in caplog.messages
+    assert "Data_Radio=3(UMTS), hours=0.00" in caplog.messages
+
+
+def test_main_no_logs(caplog):
+    """Check a missing log is reported rather than raising"""
+    la.main([])
+    assert "No log files found" in caplog.text